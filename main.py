@@ -1,78 +1,34 @@
 # -*- coding: utf-8 -*-
-import os
-import sys
-import random
-import yaml
 import keyboard
 import time
 import threading
+import queue
 import ctypes
 from ctypes import wintypes
+from src.config import load_config, compile_replies, generate_reply
 from src.wechat_helper import WeChatHelper
 
 # Windows 常量
 WM_HOTKEY = 0x0312
+WM_QUIT = 0x0012
 MOD_ALT = 0x0001
 MOD_CTRL = 0x0002
 MOD_SHIFT = 0x0004
 MOD_NOREPEAT = 0x4000  # 防止按住时重复触发
 
 
-def load_config(config_path="config/replies.yaml"):
-    config_file = os.path.join(os.path.dirname(__file__), config_path)
-    if not os.path.exists(config_file):
-        print(f"配置文件不存在: {config_file}")
-        sys.exit(1)
-    with open(config_file, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
-
-
 def parse_name(full_name):
     if not full_name:
         return "", ""
-    full_name = full_name.strip()
-
-    # 处理中文姓名（默认）
-    if any('\u4e00' <= c <= '\u9fff' for c in full_name):
-        if len(full_name) >= 2:
-            surname = full_name[0]
-            given_name = full_name[1:]
-        else:
-            surname = full_name
-            given_name = ""
-        return surname, given_name
-    else:
-        # 处理英文姓名（按空格分隔）
-        parts = full_name.split()
-        if len(parts) >= 2:
-            surname = parts[-1]
-            given_name = " ".join(parts[:-1])
-        elif len(parts) == 1:
-            surname = parts[0]
-            given_name = ""
-        else:
-            surname = ""
-            given_name = ""
-        return surname, given_name
-
-
-def generate_reply(replies, contact_info):
-    if not replies:
-        return None
-    template = random.choice(replies)
-    if contact_info:
-        result = template.replace("{name}", contact_info.full_name)
-        result = result.replace("{surname}", contact_info.surname)
-        result = result.replace("{given_name}", contact_info.given_name)
-        return result
-    result = template.replace("{name}", "").replace("{surname}", "").replace("{given_name}", "")
-    return result
-
-
-def run_hotkey_loop(hotkeys_config, callback):
+    info = WeChatHelper._parse_name(full_name)
+    return info.surname, info.given_name
+
+
+def run_hotkey_loop(hotkeys_config, callback, on_ready=None):
     """
     使用 Windows RegisterHotKey 注册系统级快捷键
     优势：不受键盘钩子干扰，自动抑制按键传递，不会出现残留字符
+    on_ready 会收到本线程 ID，可用 PostThreadMessageW 发送 WM_QUIT 结束循环
     """
     id_to_hotkey = {}
 
@@ -103,7 +59,10 @@ def run_hotkey_loop(hotkeys_config, callback):
             else:
                 print(f"[警告] 快捷键注册失败: {hotkey_str} (可能被其他程序占用)")
 
-    # Windows 消息循环，接收 WM_HOTKEY 消息
+    if on_ready:
+        on_ready(ctypes.windll.kernel32.GetCurrentThreadId())
+
+    # Windows 消息循环，接收 WM_HOTKEY 消息（收到 WM_QUIT 时 GetMessageW 返回 0）
     msg = wintypes.MSG()
     while True:
         result = ctypes.windll.user32.GetMessageW(ctypes.byref(msg), None, 0, 0)
@@ -113,6 +72,7 @@ def run_hotkey_loop(hotkeys_config, callback):
             hk_id = msg.wParam
             if hk_id in id_to_hotkey:
                 callback(id_to_hotkey[hk_id])
+            continue
         ctypes.windll.user32.TranslateMessage(ctypes.byref(msg))
         ctypes.windll.user32.DispatchMessageW(ctypes.byref(msg))
 
@@ -122,7 +82,7 @@ def run_hotkey_loop(hotkeys_config, callback):
 
 
 def main():
-    config = load_config()
+    config = compile_replies(load_config())
     wechat = WeChatHelper()
     
     if not wechat.init_wechat():
@@ -154,14 +114,11 @@ def main():
         except Exception as e:
             print(f"输入错误: {e}")
     
-    # 锁：防止多次快捷键同时处理导致冲突
-    hotkey_lock = threading.Lock()
+    # 单个工作线程串行处理快捷键，队列最多积压一个待处理事件
+    hotkey_queue = queue.Queue(maxsize=1)
 
     def _handle_hotkey(hotkey):
-        """在独立线程中处理快捷键事件"""
-        if not hotkey_lock.acquire(blocking=False):
-            print("\n[提示] 上一条消息还在处理中，请稍候...")
-            return
+        """在工作线程中处理快捷键事件"""
         try:
             hotkey_data = config.get("hotkeys", {}).get(hotkey)
             if not hotkey_data:
@@ -182,25 +139,36 @@ def main():
                 print(f"[{hotkey_data['name']}] -> {target}: {reply}\n")
         except Exception as e:
             print(f"\n[错误] 处理快捷键出错: {e}")
-        finally:
-            hotkey_lock.release()
+
+    def hotkey_worker():
+        while True:
+            _handle_hotkey(hotkey_queue.get())
+
+    threading.Thread(target=hotkey_worker, daemon=True).start()
 
     def on_hotkey(hotkey):
-        """快捷键回调：启动新线程处理，避免阻塞消息循环"""
-        threading.Thread(target=_handle_hotkey, args=(hotkey,), daemon=True).start()
+        """快捷键回调：投递给工作线程处理，避免阻塞消息循环"""
+        try:
+            hotkey_queue.put_nowait(hotkey)
+        except queue.Full:
+            print("\n[提示] 上一条消息还在处理中，请稍候...")
 
     def set_contact():
         """手动设置联系人"""
         input_contact_name()
 
+    hotkey_thread_id = []
+    # stop_program 在 keyboard 库的回调线程中执行，sys.exit 只会结束该线程，
+    # 所以改为通知主线程退出并由主线程清理
+    stop_event = threading.Event()
+
     def stop_program():
-        print("\n程序已停止")
-        sys.exit(0)
+        stop_event.set()
 
     # 用 RegisterHotKey 注册 Alt+1~5（系统级，不受键盘钩子干扰）
     hotkey_thread = threading.Thread(
         target=run_hotkey_loop,
-        args=(config.get("hotkeys", {}), on_hotkey),
+        args=(config.get("hotkeys", {}), on_hotkey, hotkey_thread_id.append),
         daemon=True
     )
     hotkey_thread.start()
@@ -209,11 +177,20 @@ def main():
     keyboard.add_hotkey("ctrl+alt+n", set_contact)
     keyboard.add_hotkey("ctrl+shift+q", stop_program)
 
-    # 主循环
+    # 主循环（带超时等待，Windows 下才能响应 Ctrl+C）
     try:
-        keyboard.wait()
+        while not stop_event.wait(timeout=0.5):
+            pass
     except KeyboardInterrupt:
-        stop_program()
+        pass
+
+    # 通知消息循环退出，等待其注销快捷键
+    keyboard.unhook_all()
+    if hotkey_thread_id:
+        ctypes.windll.user32.PostThreadMessageW(hotkey_thread_id[0], WM_QUIT, 0, 0)
+        hotkey_thread.join(timeout=1)
+    wechat.close()
+    print("\n程序已停止")
 
 
 if __name__ == "__main__":
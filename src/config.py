@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import pickle
+import random
+import string
+import yaml
+
+try:
+    from yaml import CSafeLoader as YamlLoader  # LibYAML 加速
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+# 相对路径的配置文件以项目根目录为基准
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_config(config_path="config/replies.yaml"):
+    config_file = os.path.join(PROJECT_ROOT, config_path)
+    if not os.path.exists(config_file):
+        print(f"配置文件不存在: {config_file}")
+        sys.exit(1)
+
+    # 解析结果缓存为 pickle，按 YAML 文件的 (mtime, size) 判断是否过期
+    st = os.stat(config_file)
+    cache_file = config_file + ".pkl"
+    try:
+        with open(cache_file, "rb") as f:
+            mtime, size, data = pickle.load(f)
+        if (mtime, size) == (st.st_mtime_ns, st.st_size):
+            return data
+    except Exception:
+        pass
+
+    with open(config_file, "r", encoding="utf-8") as f:
+        data = yaml.load(f, Loader=YamlLoader)
+
+    # 先写临时文件再替换，避免中途退出留下损坏的缓存
+    try:
+        tmp_file = cache_file + ".tmp"
+        with open(tmp_file, "wb") as f:
+            pickle.dump((st.st_mtime_ns, st.st_size, data), f, protocol=5)
+        os.replace(tmp_file, cache_file)
+    except Exception:
+        pass
+    return data
+
+
+def compile_replies(config):
+    """加载配置后将各快捷键的回复模板预编译为 string.Template"""
+    for hotkey_data in config.get("hotkeys", {}).values():
+        templates = []
+        for reply in hotkey_data.get("replies") or []:
+            reply = (reply.replace("$", "$$")
+                     .replace("{name}", "${name}")
+                     .replace("{surname}", "${surname}")
+                     .replace("{given_name}", "${given_name}"))
+            templates.append(string.Template(reply))
+        hotkey_data["replies"] = templates
+    return config
+
+
+def generate_reply(replies, contact_info):
+    if not replies:
+        return None
+    template = random.choice(replies)
+    if contact_info:
+        return template.substitute(
+            name=contact_info.full_name,
+            surname=contact_info.surname,
+            given_name=contact_info.given_name,
+        )
+    return template.substitute(name="", surname="", given_name="")
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+# 以下尺寸均针对放大 2 倍后的标题栏二值图
+TEXT_LINE_MIN_HEIGHT = 8    # 更矮的行段是分隔线、边框等
+TEXT_LINE_MAX_HEIGHT = 60   # 更高的行段是头像等图块
+TEXT_LINE_MAX_GAP = 6       # 同一行文字内部（如“三”的笔画间）允许的空白行数
+
+
+def crop_text_line(binary, pad: int = 4):
+    """从标题栏二值图中裁出联系人姓名所在的文字行（识别模型会把输入缩放到固定高度）
+
+    截图区域可能带上标题栏分隔线和聊天区顶部的头像/时间，
+    因此取高度合理的最上面一段连续行作为姓名，找不到时返回原图。
+    """
+    import numpy as np
+
+    rows = np.count_nonzero(binary, axis=1) > 0
+    bands = []  # [top, bottom)，合并间隔很小的相邻行段
+    start = None
+    for i, has_ink in enumerate(np.append(rows, False)):
+        if has_ink and start is None:
+            start = i
+        elif not has_ink and start is not None:
+            if bands and start - bands[-1][1] <= TEXT_LINE_MAX_GAP:
+                bands[-1][1] = i
+            else:
+                bands.append([start, i])
+            start = None
+
+    for top, bottom in bands:
+        if TEXT_LINE_MIN_HEIGHT <= bottom - top <= TEXT_LINE_MAX_HEIGHT:
+            break
+    else:
+        return binary
+
+    cols = np.flatnonzero(binary[top:bottom].any(axis=0))
+    height, width = binary.shape
+    return binary[max(top - pad, 0):min(bottom + pad, height),
+                  max(cols[0] - pad, 0):min(cols[-1] + 1 + pad, width)]
@@ -1,37 +1,193 @@
 # -*- coding: utf-8 -*-
 import win32gui
 import win32con
-import win32api
+import win32process
 import pyperclip
 import time
 import re
+import threading
+import queue
+import functools
+import ctypes
+from ctypes import wintypes
 from typing import Optional
 from dataclasses import dataclass
 
+from .image_utils import crop_text_line
 
-@dataclass
+
+# SendInput 所需的 Windows 常量与结构体
+INPUT_KEYBOARD = 1
+KEYEVENTF_KEYUP = 0x0002
+VK_CONTROL = 0x11
+VK_V = 0x56
+ULONG_PTR = ctypes.c_size_t
+
+
+class MOUSEINPUT(ctypes.Structure):
+    _fields_ = [("dx", wintypes.LONG), ("dy", wintypes.LONG),
+                ("mouseData", wintypes.DWORD), ("dwFlags", wintypes.DWORD),
+                ("time", wintypes.DWORD), ("dwExtraInfo", ULONG_PTR)]
+
+
+class KEYBDINPUT(ctypes.Structure):
+    _fields_ = [("wVk", wintypes.WORD), ("wScan", wintypes.WORD),
+                ("dwFlags", wintypes.DWORD), ("time", wintypes.DWORD),
+                ("dwExtraInfo", ULONG_PTR)]
+
+
+class HARDWAREINPUT(ctypes.Structure):
+    _fields_ = [("uMsg", wintypes.DWORD), ("wParamL", wintypes.WORD),
+                ("wParamH", wintypes.WORD)]
+
+
+class _INPUTUNION(ctypes.Union):
+    _fields_ = [("mi", MOUSEINPUT), ("ki", KEYBDINPUT), ("hi", HARDWAREINPUT)]
+
+
+class INPUT(ctypes.Structure):
+    _anonymous_ = ("u",)
+    _fields_ = [("type", wintypes.DWORD), ("u", _INPUTUNION)]
+
+
+def _key_input(vk: int, flags: int = 0) -> INPUT:
+    inp = INPUT(type=INPUT_KEYBOARD)
+    inp.ki = KEYBDINPUT(wVk=vk, dwFlags=flags)
+    return inp
+
+
+# Ctrl+V 按键序列：一次 SendInput 调用按顺序注入，无需在按键间 sleep
+_PASTE_INPUTS = (INPUT * 4)(
+    _key_input(VK_CONTROL),
+    _key_input(VK_V),
+    _key_input(VK_V, KEYEVENTF_KEYUP),
+    _key_input(VK_CONTROL, KEYEVENTF_KEYUP),
+)
+
+
+# WinEvent 钩子相关常量
+EVENT_SYSTEM_FOREGROUND = 0x0003
+EVENT_OBJECT_LOCATIONCHANGE = 0x800B
+WINEVENT_OUTOFCONTEXT = 0x0000
+OBJID_WINDOW = 0
+WM_QUIT = 0x0012
+WINEVENTPROC = ctypes.WINFUNCTYPE(
+    None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+    wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+
+# 无法安装 WinEvent 钩子时，窗口位置缓存的有效期（秒）
+RECT_CACHE_TTL = 2.0
+
+# 微信切到前台时预先识别的联系人姓名的有效期（秒）
+PREFETCH_TTL = 5.0
+
+# 微信输入框可能使用的 RichEdit 控件类名前缀（如 RICHEDIT50W、RichEdit20W）
+_RICHEDIT_CLASS_PREFIX = "richedit"
+
+
+_CJK_RE = re.compile(r'[\u4e00-\u9fff]')
+_CJK_RUN = re.compile(r'[\u4e00-\u9fff]+')
+# 标题栏中常见的非联系人文字
+_NAME_BLACKLIST = frozenset({"微信", "聊天", "通讯录", "搜索", "文件传输助手"})
+
+
+@dataclass(frozen=True)
 class ContactInfo:
     full_name: str
     surname: str
     given_name: str
 
 
+@functools.lru_cache(maxsize=256)
+def _parse_name_cached(full_name: str) -> ContactInfo:
+    """解析姓名，分离姓和名（按姓名缓存结果）"""
+    full_name = full_name.strip()
+    if _CJK_RE.search(full_name) is not None:
+        if len(full_name) >= 2:
+            return ContactInfo(full_name, full_name[0], full_name[1:])
+        return ContactInfo(full_name, full_name, "")
+    parts = full_name.split()
+    if len(parts) >= 2:
+        return ContactInfo(full_name, parts[-1], " ".join(parts[:-1]))
+    return ContactInfo(full_name, full_name, "")
+
+
 # 全局缓存 RapidOCR 实例（初始化很慢，只做一次）
 _rapidocr_instance = None
+_rapidocr_lock = threading.Lock()
+_rapidocr_ready = threading.Event()  # 加载结束（无论成功与否）后置位
+
+# 首次按键时等待后台加载 RapidOCR 的最长时间（秒）
+RAPIDOCR_WAIT_TIMEOUT = 10
 
 
 def _get_rapidocr():
     global _rapidocr_instance
     if _rapidocr_instance is None:
-        from rapidocr_onnxruntime import RapidOCR
-        _rapidocr_instance = RapidOCR()
+        with _rapidocr_lock:
+            if _rapidocr_instance is None:
+                try:
+                    from rapidocr_onnxruntime import RapidOCR
+                    _rapidocr_instance = RapidOCR()
+                finally:
+                    _rapidocr_ready.set()
     return _rapidocr_instance
 
 
+def _preload_rapidocr():
+    """后台线程：加载 RapidOCR 模型并预热"""
+    try:
+        ocr = _get_rapidocr()
+    except Exception:
+        print("[提示] RapidOCR 不可用，将使用 Tesseract")
+        return
+    # 用空白小图跑一次推理，避免首次推理的额外开销落在第一次按键上
+    try:
+        import numpy as np
+        ocr(np.zeros((32, 128), dtype=np.uint8), use_det=False, use_cls=False, use_rec=True)
+    except Exception as e:
+        print(f"[提示] RapidOCR 预热失败: {e}")
+    print("[就绪] OCR 引擎已加载")
+
+
+# Tesseract 备用引擎：只在 RapidOCR 失败时按需导入，且只尝试一次
+_tesseract = None
+_tesseract_checked = False
+
+
+def _init_tesseract():
+    global _tesseract, _tesseract_checked
+    if not _tesseract_checked:
+        _tesseract_checked = True
+        try:
+            import pytesseract
+            import os
+            os.environ['TESSDATA_PREFIX'] = 'tessdata'
+            pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+            _tesseract = pytesseract
+        except Exception:
+            _tesseract = None
+    return _tesseract
+
+
 class WeChatHelper:
     def __init__(self):
         self.wechat_hwnd: Optional[int] = None
         self.current_contact_name: Optional[str] = None
+        # 每个线程复用各自的 mss 截图实例（mss 在 Windows 上的设备上下文是线程私有的，
+        # 只能在创建它的线程里关闭；截图线程都是常驻的后台线程，实例随进程退出释放）
+        self._sct_local = threading.local()
+        # 窗口位置缓存：窗口移动/缩放时由 WinEvent 钩子清空
+        self._cached_rect: Optional[tuple] = None
+        self._rect_time = 0.0
+        self._rect_hook_active = False
+        self._hook_thread_id: Optional[int] = None
+        self._win_event_proc = None  # 保持回调引用，防止被回收
+        # 截图/OCR 同一时间只运行一次（快捷键与前台预取不并发识别）
+        self._ocr_lock = threading.Lock()
+        # 前台预取结果：(姓名, 识别时的标题栏二值图, 时间)，按快捷键时校验后使用一次
+        self._prefetched: Optional[tuple] = None
+        self._prefetch_queue: queue.Queue = queue.Queue(maxsize=1)
 
     def find_wechat_window(self) -> bool:
         """查找微信窗口句柄"""
@@ -49,38 +205,136 @@ class WeChatHelper:
         self.wechat_hwnd = windows[0][0]
         return True
 
+    @staticmethod
+    def _focused_rich_edit() -> Optional[int]:
+        """返回当前焦点所在的 RichEdit 控件句柄（新版微信为自绘界面，通常没有）"""
+        try:
+            foreground = win32gui.GetForegroundWindow()
+            thread_id, _ = win32process.GetWindowThreadProcessId(foreground)
+            focus = win32gui.GetGUIThreadInfo(thread_id)[2]
+            if focus and win32gui.GetClassName(focus).lower().startswith(_RICHEDIT_CLASS_PREFIX):
+                return focus
+        except Exception:
+            pass
+        return None
+
     def init_wechat(self) -> bool:
         """初始化微信连接"""
         if self.find_wechat_window():
+            threading.Thread(target=self._prefetch_worker, daemon=True).start()
+            threading.Thread(target=self._run_event_hooks, daemon=True).start()
             # 预热 RapidOCR（后台加载模型，避免第一次按键卡顿）
-            try:
-                _get_rapidocr()
-                print("[就绪] OCR 引擎已加载")
-            except Exception:
-                print("[提示] RapidOCR 不可用，将使用 Tesseract")
+            threading.Thread(target=_preload_rapidocr, daemon=True).start()
             return True
         print("[错误] 未找到微信窗口，请确保微信已打开")
         return False
 
-    def _parse_name(self, full_name: str) -> ContactInfo:
+    def _run_event_hooks(self) -> None:
+        """后台线程：安装 WinEvent 钩子并运行消息循环，监听微信窗口移动/缩放和切到前台"""
+        user32 = ctypes.windll.user32
+        user32.SetWinEventHook.restype = wintypes.HANDLE
+        try:
+            _, pid = win32process.GetWindowThreadProcessId(self.wechat_hwnd)
+        except Exception:
+            return
+
+        self._win_event_proc = WINEVENTPROC(self._on_win_event)
+        installed = {}
+        for event in (EVENT_OBJECT_LOCATIONCHANGE, EVENT_SYSTEM_FOREGROUND):
+            hook = user32.SetWinEventHook(
+                event, event, None, self._win_event_proc, pid, 0, WINEVENT_OUTOFCONTEXT)
+            if hook:
+                installed[event] = hook
+        hooks = list(installed.values())
+        if not hooks:
+            return
+
+        self._hook_thread_id = ctypes.windll.kernel32.GetCurrentThreadId()
+        self._rect_hook_active = EVENT_OBJECT_LOCATIONCHANGE in installed
+        try:
+            msg = wintypes.MSG()
+            while user32.GetMessageW(ctypes.byref(msg), None, 0, 0) > 0:
+                user32.TranslateMessage(ctypes.byref(msg))
+                user32.DispatchMessageW(ctypes.byref(msg))
+        finally:
+            self._rect_hook_active = False
+            self._cached_rect = None
+            for hook in hooks:
+                user32.UnhookWinEvent(wintypes.HANDLE(hook))
+
+    def _on_win_event(self, hook, event, hwnd, id_object, id_child, thread, event_time) -> None:
+        if event == EVENT_OBJECT_LOCATIONCHANGE:
+            if hwnd == self.wechat_hwnd and id_object == OBJID_WINDOW:
+                self._cached_rect = None
+        elif event == EVENT_SYSTEM_FOREGROUND:
+            if hwnd == self.wechat_hwnd:
+                # 微信切到前台：趁用户还没按快捷键，提前识别联系人
+                self._prefetched = None
+                try:
+                    self._prefetch_queue.put_nowait(None)
+                except queue.Full:
+                    pass
+
+    def _prefetch_worker(self) -> None:
+        """后台线程：串行处理前台预取请求"""
+        while True:
+            self._prefetch_queue.get()
+            try:
+                self._prefetch_contact_name()
+            except Exception:
+                pass
+
+    def _prefetch_contact_name(self) -> None:
+        """预先截图识别联系人姓名，连同识别时的标题栏图像一起保存"""
+        if not self._ocr_lock.acquire(blocking=False):
+            return  # 已有识别在进行中
+        try:
+            binary = self._capture_title()
+            name = self._recognize_title(binary) if binary is not None else None
+            # 持锁时保存结果，避免等锁的快捷键线程抢先拿到锁却看不到预取结果
+            if name:
+                self._prefetched = (name, binary.tobytes(), time.monotonic())
+        finally:
+            self._ocr_lock.release()
+
+    def _take_prefetched_name(self, binary) -> Optional[str]:
+        """取出预取结果（只用一次）；仅当未过期且标题栏图像与预取时完全一致才可信"""
+        prefetched, self._prefetched = self._prefetched, None
+        if prefetched is None:
+            return None
+        name, pixels, fetched_at = prefetched
+        if time.monotonic() - fetched_at < PREFETCH_TTL and pixels == binary.tobytes():
+            return name
+        return None
+
+    def _get_window_rect(self) -> tuple:
+        """获取微信窗口位置，优先使用缓存"""
+        rect = self._cached_rect
+        if rect is not None and (self._rect_hook_active
+                                 or time.monotonic() - self._rect_time < RECT_CACHE_TTL):
+            return rect
+        rect = win32gui.GetWindowRect(self.wechat_hwnd)
+        self._cached_rect = rect
+        self._rect_time = time.monotonic()
+        return rect
+
+    @staticmethod
+    def _parse_name(full_name: str) -> ContactInfo:
         """解析姓名，分离姓和名"""
-        full_name = full_name.strip()
-        if any('\u4e00' <= c <= '\u9fff' for c in full_name):
-            if len(full_name) >= 2:
-                return ContactInfo(full_name, full_name[0], full_name[1:])
-            return ContactInfo(full_name, full_name, "")
-        parts = full_name.split()
-        if len(parts) >= 2:
-            return ContactInfo(full_name, parts[-1], " ".join(parts[:-1]))
-        return ContactInfo(full_name, full_name, "")
+        return _parse_name_cached(full_name)
 
     def get_current_contact(self) -> Optional[ContactInfo]:
-        """获取当前联系人：先 OCR，失败则用缓存"""
+        """获取当前联系人：标题栏未变时用前台预取结果，否则 OCR，失败则用缓存"""
         try:
             if not self.wechat_hwnd:
                 return None
 
-            contact_name = self._ocr_contact_name()
+            contact_name = None
+            with self._ocr_lock:
+                binary = self._capture_title()
+                if binary is not None:
+                    contact_name = (self._take_prefetched_name(binary)
+                                    or self._recognize_title(binary))
             if contact_name:
                 self.current_contact_name = contact_name
                 info = self._parse_name(contact_name)
@@ -99,8 +353,8 @@ class WeChatHelper:
                 return self._parse_name(self.current_contact_name)
             return None
 
-    def _ocr_contact_name(self) -> Optional[str]:
-        """截图 + 预处理 + OCR 识别标题栏联系人"""
+    def _capture_title(self):
+        """截图 + 预处理：返回标题栏姓名区域的二值图"""
         try:
             import cv2
             import numpy as np
@@ -109,62 +363,74 @@ class WeChatHelper:
             if not self.wechat_hwnd:
                 return None
 
-            rect = win32gui.GetWindowRect(self.wechat_hwnd)
+            rect = self._get_window_rect()
             left, top, right, bottom = rect
 
             title_left = left + 300  # 跳过左侧边栏
-            title_width = right - title_left
             title_height = 100
+            # 只截取标题栏左侧 200px（联系人姓名所在区域），避免复制整条标题栏
+            capture_width = min(200, right - title_left)
 
-            if title_width <= 0:
+            if capture_width <= 0:
                 return None
 
-            with mss.mss() as sct:
-                monitor = {
-                    "top": top, "left": title_left,
-                    "width": title_width, "height": title_height,
-                    "mon": 0,
-                }
-                screenshot = sct.grab(monitor)
-
-            img = np.array(screenshot)[:, :, :3]
-            gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-
-            # 预处理：裁剪左侧 → 反色 → 放大3倍 → 二值化
-            cropped = gray[:, :min(200, gray.shape[1])]
-            inverted = 255 - cropped
-            scaled = cv2.resize(inverted, None, fx=3, fy=3, interpolation=cv2.INTER_CUBIC)
-            _, binary = cv2.threshold(scaled, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-
-            # 优先 RapidOCR，失败用 Tesseract
-            name = self._try_rapidocr(binary)
-            if name:
-                return name
-            return self._try_tesseract(binary)
+            sct = getattr(self._sct_local, "sct", None)
+            if sct is None:
+                sct = self._sct_local.sct = mss.mss()
+            monitor = {
+                "top": top, "left": title_left,
+                "width": capture_width, "height": title_height,
+                "mon": 0,
+            }
+            screenshot = sct.grab(monitor)
+
+            # 直接在 mss 的 BGRA 缓冲区（raw 为 bytearray）上建视图，不复制像素
+            # 注意不要用 screenshot.bgra：它是 bytes(raw)，会整块复制
+            buf = np.frombuffer(screenshot.raw, dtype=np.uint8).reshape(
+                screenshot.height, screenshot.width, 4)
+            img = buf[..., :3]
+            # 绿色通道作为亮度近似（后续是 Otsu 二值化，无需精确灰度转换）
+            gray = img[:, :, 1]
+
+            # 预处理：放大2倍 → 反相二值化（Otsu 阈值不受反色影响，直接用 BINARY_INV 省去反色这一步）
+            scaled = cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_LINEAR)
+            _, binary = cv2.threshold(scaled, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+            return binary
 
         except Exception as e:
-            print(f"[调试] OCR 出错: {e}")
+            print(f"[调试] 截图出错: {e}")
             return None
 
+    def _recognize_title(self, binary) -> Optional[str]:
+        """OCR 识别标题栏联系人：优先 RapidOCR，失败用 Tesseract"""
+        name = self._try_rapidocr(binary)
+        if name:
+            return name
+        return self._try_tesseract(binary)
+
     def _try_rapidocr(self, img) -> Optional[str]:
         try:
+            # 后台加载尚未完成时稍作等待，保证第一次按键也能用上 RapidOCR
+            if not _rapidocr_ready.wait(timeout=RAPIDOCR_WAIT_TIMEOUT):
+                return None
             ocr = _get_rapidocr()
-            result, _ = ocr(img)
+            # 裁出姓名所在的文字行后只做识别，跳过文本检测和方向分类
+            line = crop_text_line(img)
+            result, _ = ocr(line, use_det=False, use_cls=False, use_rec=True)
             if result:
-                for line in result:
-                    name = self._extract_chinese_name(line[1])
-                    if name:
-                        return name
-        except Exception:
-            pass
+                text = result[0][0]
+                return self._extract_chinese_name(text)
+        except ImportError:
+            pass  # 启动时已提示 RapidOCR 不可用
+        except Exception as e:
+            print(f"[调试] RapidOCR 出错: {e}")
         return None
 
     def _try_tesseract(self, img) -> Optional[str]:
+        pytesseract = _init_tesseract()
+        if pytesseract is None:
+            return None
         try:
-            import pytesseract
-            import os
-            os.environ['TESSDATA_PREFIX'] = 'tessdata'
-            pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
             text = pytesseract.image_to_string(img, lang='chi_sim', config='--psm 7').strip()
             if text:
                 return self._extract_chinese_name(text)
@@ -175,8 +441,8 @@ class WeChatHelper:
     def _extract_chinese_name(self, text: str) -> Optional[str]:
         """从 OCR 文本中提取中文姓名"""
         text = text.replace(" ", "")
-        for name in re.findall(r'[\u4e00-\u9fff]+', text):
-            if 2 <= len(name) <= 8 and name not in ("微信", "聊天", "通讯录", "搜索", "文件传输助手"):
+        for name in _CJK_RUN.findall(text):
+            if 2 <= len(name) <= 8 and name not in _NAME_BLACKLIST:
                 return name
         return None
 
@@ -186,7 +452,45 @@ class WeChatHelper:
         if self.current_contact_name:
             print(f"[成功] 已设置联系人: {self.current_contact_name}")
 
+    def close(self) -> None:
+        """停止 WinEvent 钩子线程"""
+        if self._hook_thread_id:
+            ctypes.windll.user32.PostThreadMessageW(self._hook_thread_id, WM_QUIT, 0, 0)
+            self._hook_thread_id = None
+
     def send_message(self, message: str) -> bool:
+        """将消息填入微信输入框：焦点在 RichEdit 控件时直接写入，否则走剪贴板粘贴"""
+        edit_hwnd = self._focused_rich_edit()
+        if edit_hwnd:
+            try:
+                if self._replace_selection(edit_hwnd, message):
+                    return True
+            except Exception:
+                pass
+        return self._paste_message(message)
+
+    @staticmethod
+    def _get_selection(edit_hwnd: int) -> tuple:
+        sel = win32gui.SendMessage(edit_hwnd, win32con.EM_GETSEL, 0, 0)
+        return sel & 0xFFFF, (sel >> 16) & 0xFFFF
+
+    def _replace_selection(self, edit_hwnd: int, message: str) -> bool:
+        """用 EM_REPLACESEL 替换选中内容，返回是否确实写入（写入后绝不能再粘贴一次）"""
+        msg_len = len(message.encode("utf-16-le")) // 2  # 控件按 UTF-16 单元计数
+        before = win32gui.SendMessage(edit_hwnd, win32con.WM_GETTEXTLENGTH, 0, 0)
+        start, end = self._get_selection(edit_hwnd)
+        win32gui.SendMessage(edit_hwnd, win32con.EM_REPLACESEL, True, message)
+        try:
+            after = win32gui.SendMessage(edit_hwnd, win32con.WM_GETTEXTLENGTH, 0, 0)
+            if after == before - (end - start) + msg_len or after != before:
+                return True
+            # 长度恰好不变（选中内容与回复等长）时，看光标是否移到了插入文本之后
+            new_start, new_end = self._get_selection(edit_hwnd)
+            return new_start == new_end == start + msg_len
+        except Exception:
+            return True  # 已发出写入却无法确认，宁可不粘贴也不要重复
+
+    def _paste_message(self, message: str) -> bool:
         """将消息粘贴到当前焦点窗口的输入框"""
         try:
             old_clipboard = ""
@@ -195,27 +499,25 @@ class WeChatHelper:
             except:
                 pass
 
-            pyperclip.copy(message)
-
-            # 短暂等待确保剪贴板就绪
-            time.sleep(0.1)
-
-            # Ctrl+V 粘贴（缩短按键间隔以加快响应）
-            win32api.keybd_event(17, 0, 0, 0)       # Ctrl down
-            time.sleep(0.01)
-            win32api.keybd_event(86, 0, 0, 0)       # V down
-            time.sleep(0.01)
-            win32api.keybd_event(86, 0, win32con.KEYEVENTF_KEYUP, 0)  # V up
-            time.sleep(0.01)
-            win32api.keybd_event(17, 0, win32con.KEYEVENTF_KEYUP, 0)  # Ctrl up
-
-            time.sleep(0.15)  # 等待粘贴完成
-
-            # 恢复剪贴板
             try:
-                pyperclip.copy(old_clipboard)
-            except:
-                pass
+                pyperclip.copy(message)
+
+                # 短暂等待确保剪贴板就绪
+                time.sleep(0.1)
+
+                # Ctrl+V 粘贴（一次 SendInput 批量注入四个按键事件）
+                sent = ctypes.windll.user32.SendInput(
+                    len(_PASTE_INPUTS), _PASTE_INPUTS, ctypes.sizeof(INPUT))
+                if sent != len(_PASTE_INPUTS):
+                    raise ctypes.WinError()
+
+                time.sleep(0.15)  # 等待粘贴完成
+            finally:
+                # 恢复剪贴板（粘贴失败时也要恢复）
+                try:
+                    pyperclip.copy(old_clipboard)
+                except:
+                    pass
 
             return True
 
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import os
+import pickle
+
+from src.config import load_config
+
+YAML_TEXT = 'hotkeys:\n  "alt+1":\n    name: "通用"\n    replies:\n      - "{name}新年好！"\n'
+
+
+def _write_yaml(path, text=YAML_TEXT):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def _read_cache(config_file):
+    with open(config_file + ".pkl", "rb") as f:
+        return pickle.load(f)
+
+
+def test_load_config_writes_cache(tmp_path):
+    config_file = _write_yaml(tmp_path / "replies.yaml")
+    data = load_config(config_file)
+    assert data["hotkeys"]["alt+1"]["name"] == "通用"
+
+    st = os.stat(config_file)
+    assert _read_cache(config_file) == (st.st_mtime_ns, st.st_size, data)
+
+
+def test_load_config_uses_cache_when_mtime_and_size_match(tmp_path):
+    config_file = _write_yaml(tmp_path / "replies.yaml")
+    load_config(config_file)
+
+    # 篡改缓存内容但保留 (mtime, size)：应直接返回缓存而不重新解析 YAML
+    mtime, size, _ = _read_cache(config_file)
+    with open(config_file + ".pkl", "wb") as f:
+        pickle.dump((mtime, size, {"from": "cache"}), f)
+    assert load_config(config_file) == {"from": "cache"}
+
+
+def test_load_config_rebuilds_cache_when_size_changes(tmp_path):
+    config_file = _write_yaml(tmp_path / "replies.yaml")
+    load_config(config_file)
+
+    _write_yaml(tmp_path / "replies.yaml", YAML_TEXT.replace("通用", "通用/简单"))
+    data = load_config(config_file)
+    assert data["hotkeys"]["alt+1"]["name"] == "通用/简单"
+    assert _read_cache(config_file)[2] == data
+
+
+def test_load_config_rebuilds_cache_when_mtime_changes(tmp_path):
+    config_file = _write_yaml(tmp_path / "replies.yaml")
+    load_config(config_file)
+
+    # 同样长度的新内容，只有 mtime 不同
+    _write_yaml(tmp_path / "replies.yaml", YAML_TEXT.replace("通用", "简单"))
+    st = os.stat(config_file)
+    os.utime(config_file, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    data = load_config(config_file)
+    assert data["hotkeys"]["alt+1"]["name"] == "简单"
+
+
+def test_load_config_ignores_corrupt_cache(tmp_path):
+    config_file = _write_yaml(tmp_path / "replies.yaml")
+    with open(config_file + ".pkl", "wb") as f:
+        f.write(b"not a pickle")
+    assert load_config(config_file)["hotkeys"]["alt+1"]["name"] == "通用"
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from src.image_utils import crop_text_line
+
+# 放大 2 倍后的标题栏截图尺寸（100x200 → 200x400）
+HEIGHT, WIDTH = 200, 400
+
+
+def _blank():
+    return np.zeros((HEIGHT, WIDTH), dtype=np.uint8)
+
+
+def _draw_name(img, top=40, left=20, height=32, width=60):
+    """用竖笔画模拟一个稀疏的两字姓名，墨迹比整行分隔线还少"""
+    img[top:top + height, left:left + width:6] = 255
+    return top, left, height, width
+
+
+def _assert_name_crop(crop, top, left, height, width, pad=4):
+    assert crop.shape == (height + 2 * pad, width - 5 + 2 * pad)
+    assert crop[pad:pad + height, pad].all()
+
+
+def test_name_with_separator_line():
+    img = _blank()
+    top, left, height, width = _draw_name(img)
+    img[150:152, :] = 255  # 贯穿整行的分隔线
+    assert np.count_nonzero(img[150:152]) > np.count_nonzero(img[top:top + height])
+
+    _assert_name_crop(crop_text_line(img), top, left, height, width)
+
+
+def test_name_with_avatar_blob_below():
+    img = _blank()
+    top, left, height, width = _draw_name(img)
+    img[120:200, 10:90] = 255  # 聊天区顶部的头像
+
+    _assert_name_crop(crop_text_line(img), top, left, height, width)
+
+
+def test_name_with_thin_top_border():
+    img = _blank()
+    img[0:2, :] = 255  # 窗口上边框
+    top, left, height, width = _draw_name(img)
+
+    _assert_name_crop(crop_text_line(img), top, left, height, width)
+
+
+def test_glyph_internal_gaps_kept_in_one_line():
+    img = _blank()
+    # 类似“三”的横笔，笔画间有空白行，也应作为一行整体裁出
+    for stroke_top in (50, 58, 66):
+        img[stroke_top:stroke_top + 3, 30:60] = 255
+    crop = crop_text_line(img)
+    assert crop.shape == (69 - 50 + 8, 30 + 8)
+
+
+def test_no_text_returns_input():
+    img = _blank()
+    img[150:152, :] = 255
+    assert crop_text_line(img) is img
+    blank = _blank()
+    assert crop_text_line(blank) is blank
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from types import SimpleNamespace
+
+import pytest
+
+from src.config import compile_replies, generate_reply
+
+
+def _legacy_reply(template, contact_info):
+    """预编译之前 generate_reply 的 str.replace 实现，作为对照"""
+    if contact_info:
+        result = template.replace("{name}", contact_info.full_name)
+        result = result.replace("{surname}", contact_info.surname)
+        return result.replace("{given_name}", contact_info.given_name)
+    return template.replace("{name}", "").replace("{surname}", "").replace("{given_name}", "")
+
+
+def _compile_one(template):
+    config = {"hotkeys": {"alt+1": {"name": "测试", "replies": [template]}}}
+    return compile_replies(config)["hotkeys"]["alt+1"]["replies"]
+
+
+CONTACT = SimpleNamespace(full_name="张三", surname="张", given_name="三")
+DOLLAR_CONTACT = SimpleNamespace(full_name="Tom $mith", surname="$mith", given_name="Tom")
+
+
+@pytest.mark.parametrize("template", [
+    "{name}新年好！",
+    "{surname}阿姨/叔叔新年好！",
+    "老{given_name}！新年好啊！",
+    "{name}abc{given_name}",            # 占位符后紧跟 ASCII 字母
+    "红包 $100，{name}收好",             # 字面量 $
+    "$name 和 ${surname} 原样保留",      # 看起来像 Template 占位符的文本
+    "{nickname} 与 {} 不是占位符",       # 未知的 {…} 原样保留
+    "{{name}}",
+    "过年好！",
+])
+@pytest.mark.parametrize("contact", [CONTACT, DOLLAR_CONTACT, None])
+def test_compiled_reply_matches_legacy_replace(template, contact):
+    assert generate_reply(_compile_one(template), contact) == _legacy_reply(template, contact)
+
+
+@pytest.mark.parametrize("replies", [None, []])
+def test_empty_replies_entry(replies):
+    config = {"hotkeys": {"alt+1": {"name": "测试", "replies": replies}}}
+    compiled = compile_replies(config)["hotkeys"]["alt+1"]["replies"]
+    assert generate_reply(compiled, CONTACT) is None